@@ -1,15 +1,15 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
+import pyarrow as pa
+import pyarrow.parquet as pq
 import os
+import tempfile
 
 
-# --- DEBUGGING: PRINT FILE LIST ---
-#st.sidebar.markdown("---")
-#st.sidebar.subheader("📂 Server File Check")
-#st.sidebar.code("\n".join(os.listdir()))
-
 # --- Page Configuration ---
 st.set_page_config(
     page_title="Peer-Group Anomaly Detection",
@@ -28,66 +28,18 @@ colors = {
     'card_bg': '#1E1E1E'
 }
 
-def apply_theme(fig):
-    fig.update_layout(
-        template='plotly_dark',
+# Streamlit reruns this script on every interaction; register the theme once per process,
+# pre-merged onto plotly_dark so figures don't re-merge a composite template either
+@st.cache_resource
+def register_theme():
+    pio.templates['pga'] = pio.templates.merge_templates('plotly_dark', go.layout.Template(layout=dict(
         paper_bgcolor='rgba(0,0,0,0)',
         plot_bgcolor='rgba(0,0,0,0)',
         font=dict(family="Roboto, sans-serif")
-    )
-    return fig
-
-# --- Load Data ---
-@st.cache_data
-def load_data():
-    try:
-        universe = pd.read_csv('ind_nifty500list.csv')
-        universe = universe[['Symbol', 'Company Name']]
-        
-        watchlist = pd.read_csv('final_project_watchlist_complete.csv')
-        
-        data = pd.merge(watchlist, universe, on='Symbol', how='left')
-        data['Company Name'] = data['Company Name'].fillna(data['Symbol'])
-        data['Status'] = data['Anomaly_Label'].apply(lambda x: 'Outlier' if x == -1 else 'Normal')
-        return data
-    except FileNotFoundError:
-        st.error("❌ Data files missing. Please upload the CSVs.")
-        return pd.DataFrame()
-
-@st.cache_data
-def load_historical_data():
-    try:
-        # Load the user's new file format
-        hist_df = pd.read_csv('nifty500_financials.csv')
-        
-        # --- PRE-PROCESSING FOR DASHBOARD ---
-        # 1. Convert Date to Year
-        if 'Financial Year End' in hist_df.columns:
-            hist_df['Year'] = pd.to_datetime(hist_df['Financial Year End']).dt.year
-        
-        # 2. Rename columns to standard names for easier plotting
-        # Mapping: New File Header -> Dashboard Internal Name
-        column_map = {
-            'Ticker': 'Symbol',
-            'Total Revenue': 'Revenue',
-            'Operating Cash Flow (CFO)': 'OCF'
-        }
-        hist_df = hist_df.rename(columns=column_map)
-        
-        return hist_df
-    except FileNotFoundError:
-        return pd.DataFrame() # Return empty if file not found
-
-df = load_data()
-hist_df = load_historical_data()
+    )))
+    pio.templates.default = 'pga'
 
-# --- Sidebar ---
-st.sidebar.title("🕵️‍♂️ Navigation")
-page = st.sidebar.radio("Go to", ["Executive Summary", "The Watchlist", "Sector Analysis", "Company Deep Dive", "Data Explorer"])
-
-st.sidebar.markdown("---")
-st.sidebar.caption("🤖 **Model:** Isolation Forest")
-st.sidebar.caption("📊 **Data:** Nifty 500 (TTM)")
+register_theme()
 
 feature_cols = ['TATA_Z', 'DSRI_Z', 'AQI_Z', 'P_OCF_Z', 'PEG_Z', 'DuPont_Discrepancy_Z']
 feature_names = {
@@ -95,6 +47,9 @@ feature_names = {
     'AQI_Z': 'Asset Quality (AQI)', 'P_OCF_Z': 'Price/CashFlow',
     'PEG_Z': 'PEG Ratio', 'DuPont_Discrepancy_Z': 'DuPont Discrepancy'
 }
+# Radar axis labels (closed loop), constant for every company
+THETAS = [feature_names[c] for c in feature_cols]
+THETAS_CLOSED = THETAS + [THETAS[0]]
 
 # --- Risk Narrative Logic ---
 risk_map = {
@@ -124,20 +79,324 @@ risk_map = {
     }
 }
 
-def get_risk_insight(row):
-    # Get the feature columns
-    vals = row[feature_cols]
-    # Find the feature with the Maximum Absolute Z-Score
-    max_col = vals.abs().idxmax()
-    max_val = vals[max_col]
-    
-    # Determine direction
-    direction = 'high' if max_val > 0 else 'low'
-    
-    # Get the narrative
-    narrative = risk_map.get(max_col, {}).get(direction, "Analysis inconclusive.")
+# --- Load Data ---
+WATCHLIST_CACHE = 'watchlist_cache.parquet'
+HISTORY_CACHE = 'financials_cache.parquet'
+# This script is listed too, so a code change invalidates both caches
+DATA_SOURCES = ['ind_nifty500list.csv', 'final_project_watchlist_complete.csv', __file__]
+HISTORY_SOURCES = ['nifty500_financials.csv', __file__]
+
+def source_version(sources):
+    # Cache key for the disk-persisted loaders: changes whenever a source file is replaced
+    return tuple(os.path.getmtime(src) if os.path.exists(src) else None for src in sources)
+
+CACHE_VERSION_KEY = b'pga_source_version'
+
+def read_parquet_cache(cache_path, version, build):
+    # Reuse the Parquet copy only if it was built for exactly this source_version() (the same key
+    # the st.cache_data loaders use), so a source restored with an older mtime still invalidates
+    # it; otherwise rebuild from CSV and refresh it. Parquet keeps category/int8/float32 dtypes.
+    key = repr(version).encode()
+    try:
+        if (pq.read_schema(cache_path).metadata or {}).get(CACHE_VERSION_KEY) == key:
+            return pd.read_parquet(cache_path)
+    except (OSError, ValueError):
+        pass # Missing, truncated or unreadable cache: rebuild it below
+    frame = build()
+    write_parquet_cache(frame, cache_path, key)
+    return frame
+
+def write_parquet_cache(frame, cache_path, key):
+    table = pa.Table.from_pandas(frame)
+    table = table.replace_schema_metadata({**table.schema.metadata, CACHE_VERSION_KEY: key})
+    tmp = None
+    try:
+        # Write beside the cache and rename over it, so a crash mid-write never leaves a truncated file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cache_path)), suffix='.parquet')
+        os.close(fd)
+        pq.write_table(table, tmp)
+        os.replace(tmp, cache_path)
+        tmp = None
+    except OSError:
+        pass # Read-only filesystem: serve the freshly parsed frame uncached
+    finally:
+        if tmp and os.path.exists(tmp):
+            os.remove(tmp)
+
+def build_data():
+    lookup = (
+        pd.read_csv('ind_nifty500list.csv', engine='pyarrow', dtype_backend='pyarrow',
+                    usecols=['Symbol', 'Company Name'],
+                    dtype={'Symbol': 'category', 'Company Name': 'string'})
+        .drop_duplicates('Symbol')
+        .set_index('Symbol')['Company Name']
+    )
+
+    # Explicit schema: skips dtype inference and loads straight into float32/int8/category
+    # (pyarrow engine: multithreaded parse, no per-column Python inference).
+    # Strings are Arrow-backed; the numeric columns stay NumPy for the argmax/mask paths below.
+    watchlist = pd.read_csv(
+        'final_project_watchlist_complete.csv', engine='pyarrow', dtype_backend='pyarrow',
+        dtype={c: 'float32' for c in feature_cols + ['Anomaly_Score', 'PCA_1', 'PCA_2']}
+              | {'Anomaly_Label': 'int8', 'Symbol': 'string', 'Sector': 'category'}
+    )
+
+    # Single-column lookup: map against the indexed Series instead of a full merge
+    watchlist['Company Name'] = watchlist['Symbol'].map(lookup).fillna(watchlist['Symbol'])
+    data = watchlist
+    data['Symbol'] = data['Symbol'].astype('category')
+
+    # One comparison feeds both the Status label and the boolean outlier flag used by every filter
+    is_outlier = data['Anomaly_Label'].to_numpy() == -1
+    data['Status'] = pd.Categorical.from_codes(is_outlier.astype(np.int8), categories=['Normal', 'Outlier'])
+    data['IsOutlier'] = is_outlier
+    data['Plot_Size'] = data['Anomaly_Score'].abs().astype('float32')
+
+    # Primary risk driver + narrative for every company in one pass
+    Z = data[feature_cols].to_numpy()
+    imax = np.abs(Z).argmax(axis=1)
+    vmax = Z[np.arange(len(Z)), imax]
+    narratives = np.array([[risk_map[c]['low'], risk_map[c]['high']] for c in feature_cols])
+    data['PrimaryDriverCol'] = np.take(feature_cols, imax)
+    data['PrimaryDriverVal'] = vmax
+    data['Narrative'] = narratives[imax, (vmax > 0).astype(int)]
+    return data
+
+def build_historical_data():
+    # Load the user's new file format (only the columns the dashboard plots)
+    hist_cols = ['Ticker', 'Financial Year End', 'Total Revenue', 'Net Income',
+                 'Operating Cash Flow (CFO)', 'Receivables', 'Total Equity']
+    # Arrow-backed columns: nullable financials without object/float64 NaN upcasts
+    hist_df = pd.read_csv('nifty500_financials.csv', engine='pyarrow', dtype_backend='pyarrow',
+                          usecols=hist_cols, dtype={'Financial Year End': 'string'})
+
+    # --- PRE-PROCESSING FOR DASHBOARD ---
+    # 1. Convert Date to Year (ISO 'YYYY-MM-DD': slice the year, no datetime parsing)
+    if 'Financial Year End' in hist_df.columns:
+        hist_df['Year'] = hist_df['Financial Year End'].str.slice(0, 4).astype('int16')
+
+    # 2. Rename columns to standard names for easier plotting
+    # Mapping: New File Header -> Dashboard Internal Name
+    column_map = {
+        'Ticker': 'Symbol',
+        'Total Revenue': 'Revenue',
+        'Operating Cash Flow (CFO)': 'OCF'
+    }
+    hist_df = hist_df.rename(columns=column_map)
+
+    # 3. Pre-sort and index by Symbol so per-company lookups skip the scan + sort
+    hist_df = hist_df.sort_values(['Symbol', 'Year']).set_index('Symbol')
+
+    return hist_df
+
+@st.cache_data(persist='disk', show_spinner=False)
+def load_data(version):
+    try:
+        return read_parquet_cache(WATCHLIST_CACHE, version, build_data)
+    except FileNotFoundError:
+        st.error("❌ Data files missing. Please upload the CSVs.")
+        return pd.DataFrame()
+
+@st.cache_data(persist='disk', show_spinner=False)
+def load_historical_data(version):
+    try:
+        return read_parquet_cache(HISTORY_CACHE, version, build_historical_data)
+    except FileNotFoundError:
+        return pd.DataFrame() # Return empty if file not found
+
+# Derived frames below are keyed on the loaded data's version instead of hashing
+# the frame itself (the leading underscore tells Streamlit to skip that argument)
+@st.cache_data
+def get_company_order(_df, version):
+    # Deep Dive selector order: outliers first, then normals (file order within each)
+    order = np.argsort(~_df['IsOutlier'].to_numpy(), kind='stable')
+    return _df['Company Name'].to_numpy()[order].tolist()
+
+@st.cache_data
+def get_name_index(_df, version):
+    # Company Name -> row position for O(1) Deep Dive lookups (first match wins, like the old filter)
+    index = {}
+    for i, name in enumerate(_df['Company Name'].tolist()):
+        index.setdefault(name, i)
+    return index
+
+@st.cache_data
+def get_outliers_sorted(_df, version):
+    # Watchlist rows: outliers only, most anomalous first
+    return _df[_df['IsOutlier']].sort_values(by='Anomaly_Score', ascending=True)
+
+@st.cache_data
+def compute_sector_stats(_df, version):
+    # Both aggregations fused into one pass over the IsOutlier flag
+    s = _df.groupby('Sector', observed=True, sort=False).agg(
+        Total=('IsOutlier', 'size'),
+        Outliers=('IsOutlier', 'sum')
+    ).reset_index()
+    s['Risk %'] = (s['Outliers'] / s['Total']) * 100
+    # Sector breaks Risk % ties so equal-risk sectors stay alphabetical
+    return s.sort_values(by=['Risk %', 'Sector'], ascending=[False, True])
+
+@st.cache_data
+def compute_driver_stats(_df, version):
+    # Outlier counts per (Sector, Primary Driver), using the driver precomputed in load_data
+    outliers = _df[_df['IsOutlier']]
+    drivers = outliers['PrimaryDriverCol'].map(feature_names).rename('Primary Driver')
+    return outliers.groupby([outliers['Sector'], drivers], observed=True).size().reset_index(name='Count')
+
+# --- Cached Figure Builders ---
+# Keyed on (data version, selector), so unrelated widget clicks reuse the built figure.
+# cache_resource hands back the same Figure object (no pickle round-trip per rerun);
+# st.plotly_chart only serializes it, so sharing one instance is safe.
+# cache_resource never expires and the version changes on every source/code edit,
+# so each builder is bounded to evict figures left behind by old versions.
+PCA_DENSITY_THRESHOLD = 500 # Above this many points the 'All' map bins Normal companies
+PCA_DENSITY_BINS = 60
+# Only these columns are handed to the market map (keeps the figure payload small)
+PCA_PLOT_COLS = ['PCA_1', 'PCA_2', 'Status', 'IsOutlier', 'Company Name', 'Sector', 'Anomaly_Score', 'Plot_Size']
+# Hover only ships the three fields it shows (via customdata), nothing else per point
+PCA_HOVER_DATA = ['Company Name', 'Sector', 'Anomaly_Score']
+PCA_HOVER_TEMPLATE = "<b>%{customdata[0]}</b><br>%{customdata[1]}<br>Score=%{customdata[2]:.3f}<extra></extra>"
+
+@st.cache_resource(max_entries=32)
+def build_pca_fig(_summary_df, version, sector):
+    if sector == 'All' and len(_summary_df) > PCA_DENSITY_THRESHOLD:
+        # Large universe: Normal companies become a fixed-size density grid,
+        # only Outliers are drawn as individual markers
+        is_out = _summary_df['IsOutlier'].to_numpy()
+        normals = _summary_df[~is_out]
+        counts, x_edges, y_edges = np.histogram2d(normals['PCA_1'], normals['PCA_2'], bins=PCA_DENSITY_BINS)
+        counts[counts == 0] = np.nan # Leave empty cells transparent
+        fig = go.Figure(go.Heatmap(
+            x=(x_edges[:-1] + x_edges[1:]) / 2, y=(y_edges[:-1] + y_edges[1:]) / 2, z=counts.T,
+            colorscale=[[0, 'rgba(0,240,255,0.15)'], [1, colors['normal']]],
+            showscale=False, name='Normal', hovertemplate="Normal companies: %{z}<extra></extra>"
+        ))
+        outlier_fig = px.scatter(
+            _summary_df[is_out], x='PCA_1', y='PCA_2', color='Status',
+            color_discrete_map={'Outlier': colors['outlier']},
+            custom_data=PCA_HOVER_DATA,
+            size='Plot_Size', size_max=15, opacity=0.8, render_mode='webgl'
+        )
+        outlier_fig.update_traces(hovertemplate=PCA_HOVER_TEMPLATE)
+        fig.add_traces(outlier_fig.data)
+        fig.update_layout(title=f"Cluster Analysis: {sector}", xaxis_title='PCA_1', yaxis_title='PCA_2')
+        return fig
+
+    fig = px.scatter(
+        _summary_df, x='PCA_1', y='PCA_2', color='Status',
+        color_discrete_map={'Normal': colors['normal'], 'Outlier': colors['outlier']},
+        custom_data=PCA_HOVER_DATA,
+        size='Plot_Size', size_max=15, opacity=0.8, render_mode='webgl',
+        title=f"Cluster Analysis: {sector}"
+    )
+    fig.update_traces(hovertemplate=PCA_HOVER_TEMPLATE)
+    return fig
+
+@st.cache_resource(max_entries=4)
+def build_sector_bar(_sector_stats, version):
+    fig = px.bar(
+        _sector_stats, x='Sector', y='Risk %', 
+        color='Risk %', color_continuous_scale='Redor', 
+        title="Percentage of Companies Flagged per Sector",
+        text_auto='.1f'
+    )
+    fig.update_traces(hovertemplate="%{x}<br>Risk: %{y:.1f}%<extra></extra>")
+    return fig
+
+@st.cache_resource(max_entries=4)
+def build_driver_stack(_driver_stats, version):
+    fig = px.bar(
+        _driver_stats, 
+        x='Sector', y='Count', color='Primary Driver',
+        title="Breakdown of Anomaly Causes by Sector",
+        color_discrete_sequence=px.colors.qualitative.Pastel,
+        barmode='stack'
+    )
+    fig.update_traces(hovertemplate="%{x}<br>%{fullData.name}: %{y}<extra></extra>")
+    return fig
+
+@st.cache_resource(max_entries=4)
+def build_box(_df, version):
+    # Box plot of Anomaly Scores by Sector
+    fig = px.box(
+        _df, x='Sector', y='Anomaly_Score', 
+        color='Sector', 
+        points='outliers', # Only show points that are outliers
+        title="Distribution of Anomaly Scores (Volatility check)"
+    )
+    fig.update_layout(showlegend=False)
+    return fig
+
+@st.cache_resource(max_entries=64)
+def build_trend_fig(_comp_hist, version, symbol, max_col):
+    # DYNAMIC CHART SELECTION
+    if max_col == 'TATA_Z':
+        # Plot Income vs Cash Flow (The classic Accrual check)
+        return px.bar(_comp_hist[['Year', 'Net Income', 'OCF']], x='Year', y=['Net Income', 'OCF'], barmode='group',
+                      title="Earnings Quality: Profit (Blue) vs Cash (Red)",
+                      color_discrete_map={'Net Income': '#00F0FF', 'OCF': '#FF2B2B'})
+
+    elif max_col == 'DSRI_Z' and 'Receivables' in _comp_hist.columns:
+        # Plot Revenue vs Receivables (Normalized or dual axis ideally, but line chart works)
+        return px.line(_comp_hist[['Year', 'Revenue', 'Receivables']], x='Year', y=['Revenue', 'Receivables'], markers=True,
+                       title="Revenue vs Receivables Growth",
+                       color_discrete_sequence=['#00F0FF', '#FFD700'])
+
+    elif max_col == 'DuPont_Discrepancy_Z' and 'Total Equity' in _comp_hist.columns:
+        # Plot ROE Components
+        return px.line(_comp_hist[['Year', 'Net Income', 'Total Equity']], x='Year', y=['Net Income', 'Total Equity'], markers=True,
+                       title="ROE Components: Income vs Equity Base",
+                       color_discrete_sequence=['#00F0FF', '#00FF00'])
+
+    # Default Chart (Revenue vs Profit)
+    return px.line(_comp_hist[['Year', 'Revenue', 'Net Income']], x='Year', y=['Revenue', 'Net Income'], markers=True,
+                   title="General Financial Performance",
+                   color_discrete_sequence=['#00F0FF', '#FFD700'])
+
+@st.cache_resource(max_entries=64)
+def build_radar_fig(_row, version, company):
+    vals = _row[feature_cols].to_numpy(dtype=np.float32)
+    vals_closed = np.concatenate([vals, vals[:1]])
     
-    return max_col, max_val, narrative
+    fig = go.Figure()
+    fig.add_trace(go.Scatterpolar(
+        r=vals_closed, theta=THETAS_CLOSED, fill='toself', name=company,
+        line_color=colors['outlier'] if _row['Status']=='Outlier' else colors['normal']
+    ))
+    fig.add_trace(go.Scatterpolar(r=np.zeros(len(vals_closed)), theta=THETAS_CLOSED, name='Sector Avg', line=dict(color='gray', dash='dash')))
+    fig.update_layout(polar=dict(radialaxis=dict(visible=True, range=[-3, 3])), title=f"{company} vs Sector Norms")
+    return fig
+
+data_version = source_version(DATA_SOURCES)
+hist_version = source_version(HISTORY_SOURCES)
+df = load_data(data_version)
+hist_df = load_historical_data(hist_version)
+if df.empty:
+    st.stop()  # load_data has already shown the missing-files error
+outlier_mask = df['IsOutlier'].to_numpy()
+
+# --- Sidebar ---
+st.sidebar.title("🕵️‍♂️ Navigation")
+page = st.sidebar.radio("Go to", ["Executive Summary", "The Watchlist", "Sector Analysis", "Company Deep Dive", "Data Explorer"])
+
+st.sidebar.markdown("---")
+st.sidebar.caption("🤖 **Model:** Isolation Forest")
+st.sidebar.caption("📊 **Data:** Nifty 500 (TTM)")
+
+def get_risk_insight(row):
+    # Driver and narrative are precomputed for every row in load_data
+    return row['PrimaryDriverCol'], row['PrimaryDriverVal'], row['Narrative']
+
+PAGE_SIZE = 50
+
+def paginate(frame, key, page_size=PAGE_SIZE):
+    # Slice on the server so only the visible page is serialized to the browser
+    n_pages = max(1, -(-len(frame) // page_size))
+    if n_pages == 1:
+        return frame
+    p = st.number_input(f"Page (1-{n_pages})", min_value=1, max_value=n_pages, value=1, key=key)
+    start = (p - 1) * page_size
+    return frame.iloc[start:start + page_size]
 
 # ==========================================
 # PAGE 1: EXECUTIVE SUMMARY
@@ -153,14 +412,20 @@ if page == "Executive Summary":
     **🎯 Goal:** Flag potential accounting irregularities or extreme mispricing for deeper manual investigation.
     """)
 
-    sectors = ['All'] + sorted(df['Sector'].unique().tolist())
+    sectors = ['All'] + df['Sector'].cat.categories.tolist()  # categories are already sorted
     selected_sector = st.selectbox("🌍 Filter View by Sector:", sectors)
 
-    summary_df = df[df['Sector'] == selected_sector].copy() if selected_sector != 'All' else df.copy()
+    if selected_sector != 'All':
+        sector_mask = (df['Sector'] == selected_sector).to_numpy()
+        summary_df = df[sector_mask]
+        summary_outliers = outlier_mask[sector_mask]
+    else:
+        summary_df = df # Read-only below, no copy needed
+        summary_outliers = outlier_mask
 
     col1, col2, col3, col4 = st.columns(4)
     total = len(summary_df)
-    outliers = len(summary_df[summary_df['Status'] == 'Outlier'])
+    outliers = int(summary_outliers.sum())
     pct = (outliers/total)*100 if total > 0 else 0
     
     col1.metric("Companies", total)
@@ -172,29 +437,26 @@ if page == "Executive Summary":
     st.subheader(f"🗺️ The Forensic Market Map ({selected_sector})")
     
     if not summary_df.empty:
-        summary_df['Plot_Size'] = summary_df['Anomaly_Score'].abs()
-        fig_pca = px.scatter(
-            summary_df, x='PCA_1', y='PCA_2', color='Status',
-            color_discrete_map={'Normal': colors['normal'], 'Outlier': colors['outlier']},
-            hover_name='Company Name', hover_data=['Sector', 'Anomaly_Score'],
-            size='Plot_Size', size_max=15, opacity=0.8,
-            title=f"Cluster Analysis: {selected_sector}"
-        )
-        fig_pca = apply_theme(fig_pca)
+        fig_pca = build_pca_fig(summary_df[PCA_PLOT_COLS], data_version, selected_sector)
         st.plotly_chart(fig_pca, use_container_width=True)
 
     if outliers > 0:
         st.subheader("🔥 Top 5 Highest Risk Companies")
-        st.table(summary_df[summary_df['Status']=='Outlier'].sort_values(by='Anomaly_Score', ascending=False).head(5)[['Company Name', 'Sector', 'Anomaly_Score']])
+        st.table(summary_df[summary_outliers].sort_values(by='Anomaly_Score', ascending=False).head(5)[['Company Name', 'Sector', 'Anomaly_Score']])
 
 # ==========================================
 # PAGE 2: THE WATCHLIST
 # ==========================================
 elif page == "The Watchlist":
     st.title("🚨 The Anomaly Watchlist")
-    outliers_df = df[df['Status'] == 'Outlier'].sort_values(by='Anomaly_Score', ascending=True)
+    outliers_df = get_outliers_sorted(df, data_version)
     display_cols = ['Company Name', 'Symbol', 'Sector', 'Anomaly_Score'] + feature_cols
-    st.dataframe(outliers_df[display_cols].style.background_gradient(subset=feature_cols, cmap='RdYlGn_r'), use_container_width=True, height=600)
+    # Native column bars instead of a Styler gradient: ships plain Arrow, no per-cell CSS
+    z_config = {
+        c: st.column_config.ProgressColumn(format="%.2f", min_value=-3, max_value=3)
+        for c in feature_cols
+    }
+    st.dataframe(paginate(outliers_df[display_cols], key='watchlist_page'), column_config=z_config, use_container_width=True, height=600)
 
 # ==========================================
 # PAGE 3: SECTOR ANALYSIS (ENHANCED)
@@ -204,28 +466,18 @@ elif page == "Sector Analysis":
     st.markdown("Deep dive into *where* the risks are concentrating and *what* is driving them.")
     
     # --- 1. SECTOR LEAGUE TABLE (Existing) ---
-    sector_stats = df.groupby('Sector').agg(
-        Total=('Symbol', 'count'), 
-        Outliers=('Status', lambda x: (x == 'Outlier').sum())
-    ).reset_index()
-    sector_stats['Risk %'] = (sector_stats['Outliers'] / sector_stats['Total']) * 100
-    sector_stats = sector_stats.sort_values(by='Risk %', ascending=False)
+    sector_stats = compute_sector_stats(df, data_version)
     
     col1, col2 = st.columns([2, 1])
     with col1:
-        fig_risk = px.bar(
-            sector_stats, x='Sector', y='Risk %', 
-            color='Risk %', color_continuous_scale='Redor', 
-            title="Percentage of Companies Flagged per Sector",
-            text_auto='.1f'
-        )
-        fig_risk = apply_theme(fig_risk)
+        fig_risk = build_sector_bar(sector_stats, data_version)
         st.plotly_chart(fig_risk, use_container_width=True)
         
     with col2:
         st.caption("Sector Summary Data")
         st.dataframe(
-            sector_stats[['Sector', 'Outliers', 'Total', 'Risk %']].style.background_gradient(subset=['Risk %'], cmap='Reds'),
+            sector_stats[['Sector', 'Outliers', 'Total', 'Risk %']],
+            column_config={'Risk %': st.column_config.ProgressColumn(format="%.1f%%", min_value=0, max_value=100)},
             hide_index=True, 
             use_container_width=True,
             height=350
@@ -237,27 +489,11 @@ elif page == "Sector Analysis":
     st.subheader("🧩 The 'Why' Analysis: Drivers of Anomalies")
     st.markdown("We know *which* sectors have outliers. This chart explains **why** they were flagged.")
     
-    # Logic to identify primary driver for every outlier
-    outliers_only = df[df['Status'] == 'Outlier'].copy()
+    # Primary driver of every outlier, grouped by Sector (computed once, memoized)
+    driver_stats = compute_driver_stats(df, data_version)
     
-    if not outliers_only.empty:
-        # Function to get the column name of the max Z-score
-        def get_driver(row):
-            return feature_names[row[feature_cols].abs().idxmax()]
-        
-        outliers_only['Primary Driver'] = outliers_only.apply(get_driver, axis=1)
-        
-        # Group by Sector and Driver
-        driver_stats = outliers_only.groupby(['Sector', 'Primary Driver']).size().reset_index(name='Count')
-        
-        fig_stacked = px.bar(
-            driver_stats, 
-            x='Sector', y='Count', color='Primary Driver',
-            title="Breakdown of Anomaly Causes by Sector",
-            color_discrete_sequence=px.colors.qualitative.Pastel,
-            barmode='stack'
-        )
-        fig_stacked = apply_theme(fig_stacked)
+    if not driver_stats.empty:
+        fig_stacked = build_driver_stack(driver_stats, data_version)
         st.plotly_chart(fig_stacked, use_container_width=True)
     else:
         st.info("No outliers found to analyze drivers.")
@@ -270,15 +506,7 @@ elif page == "Sector Analysis":
     * **Dots far above:** Extreme outliers in an otherwise normal sector.
     """)
     
-    # Box plot of Anomaly Scores by Sector
-    fig_box = px.box(
-        df, x='Sector', y='Anomaly_Score', 
-        color='Sector', 
-        points='outliers', # Only show points that are outliers
-        title="Distribution of Anomaly Scores (Volatility check)"
-    )
-    fig_box.update_layout(showlegend=False)
-    fig_box = apply_theme(fig_box)
+    fig_box = build_box(df, data_version)
     st.plotly_chart(fig_box, use_container_width=True)
 
 # ==========================================
@@ -288,19 +516,17 @@ elif page == "Company Deep Dive":
     st.title("🔎 Forensic Deep Dive")
     
     # 1. Company Selector (Outliers First)
-    comps = df[df['Status']=='Outlier']['Company Name'].tolist() + df[df['Status']=='Normal']['Company Name'].tolist()
+    comps = get_company_order(df, data_version)
     sel_comp = st.selectbox("Select Company:", comps)
     
     # Get Data
-    row = df[df['Company Name'] == sel_comp].iloc[0]
+    row = df.iloc[get_name_index(df, data_version)[sel_comp]]
     symbol = row['Symbol']
     symbol = str(symbol+".NS")    
 
     # --- 2. KPI HEADER (Clean & Professional) ---
-    # Calculate Primary Risk Driver
-    vals = row[feature_cols]
-    max_col = vals.abs().idxmax() # e.g., 'TATA_Z'
-    max_val = vals[max_col]       # e.g., 2.5
+    # Primary Risk Driver (precomputed in load_data)
+    max_col, max_val, narrative = get_risk_insight(row)  # e.g., 'TATA_Z', 2.5
     driver_name = feature_names[max_col]
     
     # KPI Row
@@ -318,27 +544,33 @@ elif page == "Company Deep Dive":
     # Prepare Historical Data for this company
     comp_hist = pd.DataFrame()
     if not hist_df.empty:
-        comp_hist = hist_df[hist_df['Symbol'] == symbol].sort_values(by='Year')
+        comp_hist = hist_df.loc[[symbol]] if symbol in hist_df.index else pd.DataFrame()
 
     with col_insight:
         st.subheader("📝 Forensic Insight")
+        st.caption(narrative)  # risk_map reading of the primary driver's direction
         
         # Define logic for the "Insight" text and "Evidence" metrics based on the Risk Driver
         if max_col == 'TATA_Z': # Accruals
             st.warning(f"**High Accruals Detected.** {sel_comp} is reporting profits that are not backed by operating cash flow.")
             if not comp_hist.empty:
-                latest = comp_hist.iloc[-1]
-                st.metric("Latest Net Income", f"₹{latest['Net Income']/1e7:.1f} Cr")
-                st.metric("Latest OCF", f"₹{latest['OCF']/1e7:.1f} Cr", delta=f"Gap: {(latest['OCF']-latest['Net Income'])/1e7:.1f} Cr", delta_color="off")
+                ni = comp_hist['Net Income'].to_numpy('float64', na_value=np.nan)
+                ocf = comp_hist['OCF'].to_numpy('float64', na_value=np.nan)
+                st.metric("Latest Net Income", f"₹{ni[-1]/1e7:.1f} Cr")
+                st.metric("Latest OCF", f"₹{ocf[-1]/1e7:.1f} Cr", delta=f"Gap: {(ocf[-1]-ni[-1])/1e7:.1f} Cr", delta_color="off")
         
         elif max_col == 'DSRI_Z': # Receivables
             st.warning(f"**Aggressive Revenue Recognition?** Receivables are growing significantly faster than Sales.")
             if not comp_hist.empty:
-                latest = comp_hist.iloc[-1]
-                prev = comp_hist.iloc[-2] if len(comp_hist) > 1 else latest
+                prev_i = -2 if len(comp_hist) > 1 else -1
+                rev = comp_hist['Revenue'].to_numpy('float64', na_value=np.nan)
                 
-                rev_growth = ((latest['Revenue'] - prev['Revenue']) / prev['Revenue']) * 100
-                rec_growth = ((latest['Receivables'] - prev['Receivables']) / prev['Receivables']) * 100 if 'Receivables' in latest else 0
+                rev_growth = ((rev[-1] - rev[prev_i]) / rev[prev_i]) * 100
+                if 'Receivables' in comp_hist.columns:
+                    rec = comp_hist['Receivables'].to_numpy('float64', na_value=np.nan)
+                    rec_growth = ((rec[-1] - rec[prev_i]) / rec[prev_i]) * 100
+                else:
+                    rec_growth = 0
                 
                 st.metric("Revenue Growth (YoY)", f"{rev_growth:.1f}%")
                 st.metric("Receivables Growth (YoY)", f"{rec_growth:.1f}%", delta=f"Excess: {rec_growth-rev_growth:.1f}%", delta_color="inverse")
@@ -346,10 +578,11 @@ elif page == "Company Deep Dive":
         elif max_col == 'DuPont_Discrepancy_Z': # ROE / Growth
             st.warning(f"**DuPont Mismatch.** The ROE being reported may be unsustainable given the equity base.")
             if not comp_hist.empty and 'Total Equity' in comp_hist.columns:
-                latest = comp_hist.iloc[-1]
-                roe = (latest['Net Income'] / latest['Total Equity']) * 100
+                ni = comp_hist['Net Income'].to_numpy('float64', na_value=np.nan)
+                equity = comp_hist['Total Equity'].to_numpy('float64', na_value=np.nan)
+                roe = (ni[-1] / equity[-1]) * 100
                 st.metric("Return on Equity (ROE)", f"{roe:.1f}%")
-                st.metric("Equity Base", f"₹{latest['Total Equity']/1e7:.1f} Cr")
+                st.metric("Equity Base", f"₹{equity[-1]/1e7:.1f} Cr")
 
         else: # Default/Other
             st.info(f"The primary deviation is in **{driver_name}**. This warrants a review of the company's valuation or asset structure relative to peers.")
@@ -358,51 +591,14 @@ elif page == "Company Deep Dive":
         st.subheader("📉 Supporting Evidence (Trend)")
         
         if not comp_hist.empty:
-            # DYNAMIC CHART SELECTION
-            if max_col == 'TATA_Z':
-                # Plot Income vs Cash Flow (The classic Accrual check)
-                fig = px.bar(comp_hist, x='Year', y=['Net Income', 'OCF'], barmode='group',
-                             title="Earnings Quality: Profit (Blue) vs Cash (Red)",
-                             color_discrete_map={'Net Income': '#00F0FF', 'OCF': '#FF2B2B'})
-            
-            elif max_col == 'DSRI_Z' and 'Receivables' in comp_hist.columns:
-                # Plot Revenue vs Receivables (Normalized or dual axis ideally, but line chart works)
-                fig = px.line(comp_hist, x='Year', y=['Revenue', 'Receivables'], markers=True,
-                              title="Revenue vs Receivables Growth",
-                              color_discrete_sequence=['#00F0FF', '#FFD700'])
-            
-            elif max_col == 'DuPont_Discrepancy_Z' and 'Total Equity' in comp_hist.columns:
-                # Plot ROE Components
-                fig = px.line(comp_hist, x='Year', y=['Net Income', 'Total Equity'], markers=True,
-                              title="ROE Components: Income vs Equity Base",
-                              color_discrete_sequence=['#00F0FF', '#00FF00'])
-                
-            else:
-                # Default Chart (Revenue vs Profit)
-                fig = px.line(comp_hist, x='Year', y=['Revenue', 'Net Income'], markers=True,
-                              title="General Financial Performance",
-                              color_discrete_sequence=['#00F0FF', '#FFD700'])
-            
-            fig = apply_theme(fig)
+            fig = build_trend_fig(comp_hist, hist_version, symbol, max_col)
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("No historical data available to plot the specific anomaly trend.")
 
     # --- 4. THE RADAR SCAN (Kept for completeness) ---
     st.markdown("### 🕸️ Full Forensic Fingerprint")
-    vals = [row[c] for c in feature_cols]
-    vals += [vals[0]]
-    thetas = [feature_names[c] for c in feature_cols]
-    thetas += [thetas[0]]
-    
-    fig_radar = go.Figure()
-    fig_radar.add_trace(go.Scatterpolar(
-        r=vals, theta=thetas, fill='toself', name=sel_comp,
-        line_color=colors['outlier'] if row['Status']=='Outlier' else colors['normal']
-    ))
-    fig_radar.add_trace(go.Scatterpolar(r=[0]*len(vals), theta=thetas, name='Sector Avg', line=dict(color='gray', dash='dash')))
-    fig_radar.update_layout(polar=dict(radialaxis=dict(visible=True, range=[-3, 3])), title=f"{sel_comp} vs Sector Norms")
-    fig_radar = apply_theme(fig_radar)
+    fig_radar = build_radar_fig(row, data_version, sel_comp)
     st.plotly_chart(fig_radar, use_container_width=True)
 
 # ==========================================
@@ -411,6 +607,14 @@ elif page == "Company Deep Dive":
 elif page == "Data Explorer":
     st.title("📂 Data Explorer")
 
-    st.dataframe(df)
+    # Only the chosen window of rows/columns is serialized each rerun
+    col_rows, col_cols = st.columns([1, 3])
+    page_size = col_rows.selectbox("Rows per page", [50, 100, 500, 'All'], index=0)
+    default_cols = (['Company Name', 'Symbol', 'Sector', 'Status', 'Anomaly_Score'] + feature_cols
+                    + ['Anomaly_Label', 'PCA_1', 'PCA_2'])
+    shown_cols = col_cols.multiselect("Columns", df.columns.tolist(), default=default_cols)
+
+    view = df[shown_cols]
+    st.dataframe(view if page_size == 'All' else paginate(view, key='explorer_page', page_size=page_size))
 
 